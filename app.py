@@ -2,87 +2,204 @@ import os
 import logging
 import re
 import json
-import subprocess
+import secrets
 from urllib.parse import urlparse, parse_qs
-from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor, CancelledError
+from concurrent.futures.process import BrokenProcessPool
+from flask import Flask, render_template, request, redirect, url_for, flash, send_file, jsonify, Response
+from cachetools import TTLCache
+from yt_dlp import YoutubeDL
+from yt_dlp.utils import DownloadError
 import threading
 import time
 from datetime import datetime
 
+# Prefer orjson for (de)serializing progress, falling back to the stdlib
+try:
+    import orjson
+
+    def json_dumps(obj):
+        return orjson.dumps(obj).decode()
+
+    json_loads = orjson.loads
+except ImportError:
+    json_dumps = json.dumps
+    json_loads = json.loads
+
 # Configure logging
 logging.basicConfig(level=logging.DEBUG)
 
 app = Flask(__name__)
 app.secret_key = os.environ.get("SESSION_SECRET", "dev-secret-key-change-in-production")
+app.config['USE_X_SENDFILE'] = os.environ.get("USE_X_SENDFILE") == "1"
+
+# Download progress, bounded so finished downloads expire after an hour
+PROGRESS_TTL = 60 * 60
+download_progress = TTLCache(maxsize=1024, ttl=PROGRESS_TTL)
+# Guards download_progress (TTLCache is not thread-safe) and signals changes
+progress_cond = threading.Condition()
+PROGRESS_NOT_FOUND = {
+    'status': 'not_found',
+    'error': 'Download not found'
+}
+
+# With REDIS_URL set, progress lives in Redis so every worker process sees it
+REDIS_URL = os.environ.get("REDIS_URL")
+if REDIS_URL:
+    import redis
+    redis_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+else:
+    redis_client = None
+
+# Shared worker pool so concurrent downloads don't each get their own thread
+MAX_CONCURRENT_DOWNLOADS = int(os.environ.get("MAX_CONCURRENT_DOWNLOADS", 4))
+download_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENT_DOWNLOADS,
+                                       thread_name_prefix='download')
+
+# Worker processes for batch analysis, created on first use
+MAX_BATCH_URLS = 50
+analyze_executor = None
+analyze_executor_lock = threading.Lock()
+
+# Video metadata cache keyed by video ID, so re-analyzing a URL skips yt-dlp
+METADATA_TTL = 24 * 60 * 60
+META_CACHE = TTLCache(maxsize=256, ttl=METADATA_TTL)
+# Raw yt-dlp output, kept separately so the download path can reuse it
+RAW_META_CACHE = TTLCache(maxsize=64, ttl=METADATA_TTL)
+meta_cache_lock = threading.Lock()
+# Don't start a download on cached stream URLs that expire within this window
+MANIFEST_EXPIRY_MARGIN = 10 * 60
+
+# Options for metadata lookups. YoutubeDL is not thread-safe, so each lookup
+# builds its own instance rather than serializing on a shared one
+METADATA_YDL_OPTS = {
+    'quiet': True,
+    'no_warnings': True,
+    'skip_download': True,
+    'socket_timeout': 30
+}
 
-# Global dictionary to store download progress
-download_progress = {}
+YOUTUBE_REGEX = re.compile(
+    r'(https?://)?(www\.|m\.|music\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
+    r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
+)
+
+RESOLUTION_REGEX = re.compile(r'[1-9]\d{1,3}p')
+
+def video_quality_options(height):
+    """Build yt-dlp options for downloading video at up to the given height"""
+    return {
+        'format': f'best[height<={height}][ext=mp4]/best[ext=mp4]/best',
+        'outtmpl': f'downloads/%(title)s_{height}p.%(ext)s'
+    }
+
+# yt-dlp options for the standard quality tiers, built once at import
+QUALITY_OPTIONS = {
+    f'{height}p': video_quality_options(height)
+    for height in ('144', '240', '360', '480', '720', '1080', '1440', '2160')
+}
+QUALITY_OPTIONS['audio'] = {
+    'format': 'bestaudio[ext=m4a]/bestaudio/best',
+    'outtmpl': 'downloads/%(title)s_audio.%(ext)s',
+    'postprocessors': [{
+        'key': 'FFmpegExtractAudio',
+        'preferredcodec': 'mp3'
+    }]
+}
 
 def is_youtube_url(url):
     """Validate if the URL is a YouTube URL"""
-    youtube_regex = re.compile(
-        r'(https?://)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)/'
-        r'(watch\?v=|embed/|v/|.+\?v=)?([^&=%\?]{11})'
-    )
-    return youtube_regex.match(url) is not None
+    return YOUTUBE_REGEX.match(url) is not None
 
 def get_video_id(url):
     """Extract video ID from YouTube URL"""
     parsed_url = urlparse(url)
-    if parsed_url.hostname == 'youtu.be':
-        return parsed_url.path[1:]
-    if parsed_url.hostname in ('www.youtube.com', 'youtube.com'):
+    hostname = parsed_url.hostname or ''
+    if hostname == 'youtu.be':
+        return parsed_url.path[1:12] or None
+    if hostname == 'youtube.com' or hostname.endswith('.youtube.com'):
         if parsed_url.path == '/watch':
-            p = parse_qs(parsed_url.query)
-            return p['v'][0]
-        if parsed_url.path[:7] == '/embed/':
-            return parsed_url.path.split('/')[2]
-        if parsed_url.path[:3] == '/v/':
-            return parsed_url.path.split('/')[2]
+            return parse_qs(parsed_url.query).get('v', [None])[0]
+        parts = parsed_url.path.split('/', 3)
+        if len(parts) >= 3 and parts[1] in ('embed', 'v', 'shorts'):
+            return parts[2][:11] or None
     return None
 
+BYTES_TO_MB = 1.0 / (1 << 20)
+
+def is_mp4_video(fmt):
+    """Check whether a yt-dlp format is an mp4 with both video and audio"""
+    return (fmt.get('ext') == 'mp4' and
+            fmt.get('vcodec') != 'none' and
+            fmt.get('acodec') != 'none' and
+            bool(fmt.get('height')))
+
+def shape_video_format(fmt):
+    """Build the template-facing summary of a yt-dlp video format"""
+    filesize = fmt.get('filesize') or 0
+    return {
+        'resolution': f"{fmt['height']}p",
+        'filesize': filesize,
+        'filesize_mb': round(filesize * BYTES_TO_MB, 1),
+        'format_id': fmt.get('format_id')
+    }
+
+def get_cached_video_info(video_id):
+    """Return cached video information, or None on a miss"""
+    if not video_id:
+        return None
+    with meta_cache_lock:
+        return META_CACHE.get(video_id)
+
+def cache_video_info(video_id, video_data, video_info):
+    """Store raw yt-dlp data and the derived video information"""
+    if not video_id:
+        return
+    with meta_cache_lock:
+        META_CACHE[video_id] = video_info
+        RAW_META_CACHE[video_id] = video_data
+
 def get_video_info(url):
-    """Get video information using yt-dlp"""
+    """Get video information using yt-dlp, shaped for the index template"""
+    video_id = get_video_id(url)
+    cached = get_cached_video_info(video_id)
+    if cached:
+        return cached
+
+    result = extract_video_info(url)
+    if not result:
+        return None
+    
+    video_data, video_info = result
+    cache_video_info(video_id, video_data, video_info)
+    return video_info
+
+def extract_video_info(url):
+    """Run yt-dlp extraction, returning (raw data, video information) or None
+
+    Doesn't touch the metadata cache, so it can run in a worker process.
+    """
     try:
-        cmd = [
-            'yt-dlp',
-            '--dump-json',
-            '--no-download',
-            url
-        ]
-        
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=30)
-        
-        if result.returncode != 0:
-            logging.error(f"yt-dlp error: {result.stderr}")
-            return None
-            
-        video_data = json.loads(result.stdout)
+        with YoutubeDL(METADATA_YDL_OPTS) as ydl:
+            info = ydl.extract_info(url, download=False)
+            video_data = ydl.sanitize_info(info)
         
         # Get available formats
         formats = video_data.get('formats', [])
         
-        # Filter video formats (mp4 with video and audio)
-        video_formats = []
+        # Filter video formats (mp4 with video and audio), keeping the
+        # largest file for each resolution
+        best_formats = {}
         for fmt in formats:
-            if (fmt.get('ext') == 'mp4' and 
-                fmt.get('vcodec') != 'none' and 
-                fmt.get('acodec') != 'none' and
-                fmt.get('height')):
-                video_formats.append({
-                    'resolution': f"{fmt.get('height')}p",
-                    'filesize': fmt.get('filesize', 0),
-                    'filesize_mb': round(fmt.get('filesize', 0) / (1024 * 1024), 1) if fmt.get('filesize') else 0,
-                    'format_id': fmt.get('format_id')
-                })
+            if is_mp4_video(fmt):
+                current = best_formats.get(fmt['height'])
+                if current is None or (fmt.get('filesize') or 0) > (current.get('filesize') or 0):
+                    best_formats[fmt['height']] = fmt
         
-        # Remove duplicates and sort by resolution
-        seen_resolutions = set()
-        unique_formats = []
-        for fmt in sorted(video_formats, key=lambda x: int(x['resolution'][:-1]), reverse=True):
-            if fmt['resolution'] not in seen_resolutions:
-                seen_resolutions.add(fmt['resolution'])
-                unique_formats.append(fmt)
+        # Sort by resolution
+        unique_formats = [shape_video_format(best_formats[height])
+                          for height in sorted(best_formats, reverse=True)]
         
         # Get audio format
         audio_format = None
@@ -90,149 +207,189 @@ def get_video_info(url):
             if (fmt.get('ext') in ['m4a', 'mp3'] and 
                 fmt.get('acodec') != 'none' and 
                 fmt.get('vcodec') == 'none'):
+                filesize = fmt.get('filesize') or 0
                 audio_format = {
-                    'filesize': fmt.get('filesize', 0),
-                    'filesize_mb': round(fmt.get('filesize', 0) / (1024 * 1024), 1) if fmt.get('filesize') else 0,
+                    'filesize': filesize,
+                    'filesize_mb': round(filesize * BYTES_TO_MB, 1),
                     'format_id': fmt.get('format_id')
                 }
                 break
         
-        return {
+        # Shaped for the template, so cache hits can be rendered directly
+        video_info = {
             'title': video_data.get('title', 'Unknown'),
-            'duration': video_data.get('duration', 0),
-            'uploader': video_data.get('uploader', 'Unknown'),
-            'view_count': video_data.get('view_count', 0),
-            'thumbnail': video_data.get('thumbnail', ''),
-            'video_formats': unique_formats,
-            'audio_format': audio_format
+            'length': video_data.get('duration', 0),
+            'author': video_data.get('uploader', 'Unknown'),
+            'views': video_data.get('view_count', 0),
+            'thumbnail_url': video_data.get('thumbnail', ''),
+            'video_streams': unique_formats,
+            'audio_size_mb': audio_format['filesize_mb'] if audio_format else 0
         }
         
-    except subprocess.TimeoutExpired:
-        logging.error("yt-dlp command timed out")
-        return None
-    except json.JSONDecodeError as e:
-        logging.error(f"Failed to parse yt-dlp output: {e}")
+        return video_data, video_info
+        
+    except DownloadError as e:
+        logging.error(f"yt-dlp error: {e}")
         return None
     except Exception as e:
         logging.error(f"Error getting video info: {e}")
         return None
 
+def get_quality_options(quality):
+    """Return yt-dlp options for a download quality, or None if it isn't valid"""
+    options = QUALITY_OPTIONS.get(quality)
+    if options is None and RESOLUTION_REGEX.fullmatch(quality):
+        # Formats with an uncommon height (e.g. vertical videos) still
+        # need to be downloadable
+        options = video_quality_options(quality[:-1])
+    return options
+
+def manifest_expired(video_data):
+    """Check whether the signed stream URLs in raw yt-dlp data have expired"""
+    for fmt in video_data.get('formats', []):
+        expire = parse_qs(urlparse(fmt.get('url') or '').query).get('expire')
+        if expire:
+            return int(expire[0]) - time.time() < MANIFEST_EXPIRY_MARGIN
+    # No expiry to check against, so don't trust the cached URLs
+    return True
+
+def get_cached_manifest(url):
+    """Return raw yt-dlp data cached by /analyze if its stream URLs are still valid"""
+    video_id = get_video_id(url)
+    if not video_id:
+        return None
+    with meta_cache_lock:
+        video_data = RAW_META_CACHE.get(video_id)
+    if video_data is None or manifest_expired(video_data):
+        return None
+    return video_data
+
+def progress_key(download_id):
+    """Redis key (and pub/sub channel) holding a download's progress"""
+    return f'download:{download_id}'
+
+def update_progress(download_id, **fields):
+    """Update download progress and wake any clients streaming it"""
+    if redis_client:
+        key = progress_key(download_id)
+        pipe = redis_client.pipeline()
+        pipe.hset(key, mapping={name: json_dumps(value) for name, value in fields.items()})
+        pipe.expire(key, PROGRESS_TTL)
+        pipe.publish(key, json_dumps(fields))
+        pipe.execute()
+        return
+    
+    with progress_cond:
+        progress = download_progress.get(download_id, {})
+        progress.update(fields)
+        # Reassign so an active download's entry doesn't expire mid-transfer
+        download_progress[download_id] = progress
+        progress_cond.notify_all()
+
+def read_progress(download_id):
+    """Return a snapshot of download progress, or None if unknown or expired"""
+    if redis_client:
+        progress = redis_client.hgetall(progress_key(download_id))
+        return {name: json_loads(value) for name, value in progress.items()} or None
+    
+    with progress_cond:
+        progress = download_progress.get(download_id)
+        return dict(progress) if progress else None
+
+def progress_updates(download_id, timeout=15):
+    """Yield download progress whenever it changes, or again after `timeout` idle seconds"""
+    if redis_client:
+        pubsub = redis_client.pubsub(ignore_subscribe_messages=True)
+        # Subscribe before the first read so no update can slip in between
+        pubsub.subscribe(progress_key(download_id))
+        try:
+            while True:
+                yield read_progress(download_id)
+                pubsub.get_message(timeout=timeout)
+        finally:
+            pubsub.close()
+    else:
+        progress = read_progress(download_id)
+        while True:
+            yield progress
+            with progress_cond:
+                progress_cond.wait_for(lambda: read_progress(download_id) != progress, timeout=timeout)
+                progress = read_progress(download_id)
+
 def download_video_thread(youtube_url, quality, download_id):
     """Download video in a separate thread using yt-dlp"""
     try:
-        # Initialize progress
-        download_progress[download_id] = {
-            'percentage': 0,
-            'bytes_downloaded': 0,
-            'total_size': 0,
-            'status': 'starting',
-            'title': 'Getting video info...'
-        }
-        
         # Create downloads directory if it doesn't exist
         os.makedirs('downloads', exist_ok=True)
         
-        # Prepare yt-dlp command
-        if quality == 'audio':
-            # Download audio only
-            cmd = [
-                'yt-dlp',
-                '-f', 'bestaudio[ext=m4a]/bestaudio/best',
-                '--extract-audio',
-                '--audio-format', 'mp3',
-                '-o', 'downloads/%(title)s_audio.%(ext)s',
-                youtube_url
-            ]
-        else:
-            # Download video with specific resolution
-            cmd = [
-                'yt-dlp',
-                '-f', f'best[height<={quality[:-1]}][ext=mp4]/best[ext=mp4]/best',
-                '-o', f'downloads/%(title)s_{quality}.%(ext)s',
-                youtube_url
-            ]
+        # Prepare yt-dlp options
+        quality_options = get_quality_options(quality)
+        if quality_options is None:
+            raise ValueError(f'Unsupported quality: {quality}')
+        ydl_opts = dict(quality_options)
         
-        download_progress[download_id]['status'] = 'downloading'
+        update_progress(download_id, status='downloading')
         
-        # Run yt-dlp with progress tracking
-        process = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, 
-                                 text=True, universal_newlines=True)
+        def progress_hook(d):
+            if d['status'] == 'downloading':
+                downloaded = d.get('downloaded_bytes') or 0
+                total = d.get('total_bytes') or d.get('total_bytes_estimate') or 0
+                update_progress(
+                    download_id,
+                    status='downloading',
+                    percentage=round(downloaded * 100 / total, 1) if total else 0,
+                    bytes_downloaded=downloaded,
+                    total_size=total,
+                    title=d['info_dict'].get('title', 'Unknown')
+                )
+            elif d['status'] == 'finished':
+                # Post-processing (e.g. audio extraction) still runs after this,
+                # so completion is only reported once yt-dlp returns
+                update_progress(download_id, percentage=100)
         
-        filename = None
-        if process.stdout:
-            for line in process.stdout:
-                line = line.strip()
-                logging.debug(f"yt-dlp output: {line}")
-                
-                # Extract filename from output
-                if '[download] Destination:' in line:
-                    filename = line.split('[download] Destination:')[1].strip()
-                    # Get just the filename without path
-                    filename = os.path.basename(filename)
-                    
-                # Parse progress information
-                if '[download]' in line and '%' in line:
-                    try:
-                        # Extract percentage
-                        if 'of' in line:
-                            parts = line.split()
-                            for i, part in enumerate(parts):
-                                if '%' in part:
-                                    percentage = float(part.replace('%', ''))
-                                    download_progress[download_id]['percentage'] = round(percentage, 1)
-                                    
-                                    # Try to extract size info
-                                    if i + 2 < len(parts) and 'of' in parts[i + 1]:
-                                        try:
-                                            downloaded = parts[i + 1].split('of')[0].strip()
-                                            total = parts[i + 1].split('of')[1].strip()
-                                            
-                                            # Convert sizes to bytes (simplified)
-                                            download_progress[download_id]['status'] = 'downloading'
-                                        except:
-                                            pass
-                                    break
-                    except:
-                        pass
-                
-                # Get video title if available
-                if 'title' not in download_progress[download_id] or download_progress[download_id]['title'] == 'Getting video info...':
-                    if filename:
-                        # Extract title from filename
-                        title = filename.replace(f'_{quality}', '').replace('_audio', '')
-                        title = title.split('.')[0] if '.' in title else title
-                        download_progress[download_id]['title'] = title
+        def postprocessor_hook(d):
+            # yt-dlp calls back around each post-processor (ffmpeg) run,
+            # so the client sees this phase without anyone polling for it
+            if d['status'] == 'started':
+                update_progress(download_id, status='processing')
         
-        process.wait()
+        ydl_opts.update({
+            'quiet': True,
+            'no_warnings': True,
+            'progress_hooks': [progress_hook],
+            'postprocessor_hooks': [postprocessor_hook]
+        })
         
-        if process.returncode == 0:
-            download_progress[download_id]['status'] = 'completed'
-            download_progress[download_id]['percentage'] = 100
-            download_progress[download_id]['filename'] = filename if filename else 'download_completed'
-            
-            # Find the actual downloaded file
-            download_dir = 'downloads'
-            if filename:
-                filepath = os.path.join(download_dir, filename)
-                if os.path.exists(filepath):
-                    download_progress[download_id]['filepath'] = filepath
-                else:
-                    # Search for similar files
-                    for file in os.listdir(download_dir):
-                        if quality in file or 'audio' in file:
-                            download_progress[download_id]['filepath'] = os.path.join(download_dir, file)
-                            download_progress[download_id]['filename'] = file
-                            break
+        # Run yt-dlp in-process with progress tracking
+        with YoutubeDL(ydl_opts) as ydl:
+            video_data = get_cached_manifest(youtube_url)
+            if video_data:
+                # Reuse the formats resolved at analyze time instead of extracting again
+                try:
+                    info = ydl.process_ie_result(ydl.sanitize_info(video_data, True), download=True)
+                except DownloadError as e:
+                    logging.warning(f"Cached manifest failed, re-extracting: {e}")
+                    info = ydl.extract_info(youtube_url)
+            else:
+                info = ydl.extract_info(youtube_url)
+        
+        # yt-dlp reports the final path, after post-processing and moves
+        downloads = (info or {}).get('requested_downloads') or []
+        if downloads and downloads[0].get('filepath'):
+            filepath = downloads[0]['filepath']
+            update_progress(
+                download_id,
+                status='completed',
+                percentage=100,
+                filepath=filepath,
+                filename=os.path.basename(filepath)
+            )
         else:
-            download_progress[download_id]['status'] = 'error'
-            download_progress[download_id]['error'] = 'Download failed'
+            update_progress(download_id, status='error', error='Download failed')
             
     except Exception as e:
         logging.error(f"Download error: {str(e)}")
-        download_progress[download_id] = {
-            'status': 'error',
-            'error': str(e)
-        }
+        update_progress(download_id, status='error', error=str(e))
 
 @app.route('/')
 def index():
@@ -257,25 +414,90 @@ def analyze_video():
             flash('Unable to analyze video. Please check the URL and try again.', 'error')
             return redirect(url_for('index'))
         
-        # Format the data for template
-        video_data = {
-            'title': video_info['title'],
-            'length': video_info['duration'],
-            'author': video_info['uploader'],
-            'views': video_info['view_count'],
-            'thumbnail_url': video_info['thumbnail'],
-            'video_streams': video_info['video_formats'],
-            'audio_size_mb': video_info['audio_format']['filesize_mb'] if video_info['audio_format'] else 0,
-            'url': url
-        }
-        
-        return render_template('index.html', video_info=video_data)
+        # Copy rather than mutate the cached entry, which is shared across requests
+        return render_template('index.html', video_info=dict(video_info, url=url))
         
     except Exception as e:
         logging.error(f"Error analyzing video: {str(e)}")
         flash(f'Error analyzing video: {str(e)}', 'error')
         return redirect(url_for('index'))
 
+def get_analyze_executor():
+    """Return the process pool used for batch analysis, creating it if needed"""
+    global analyze_executor
+    with analyze_executor_lock:
+        if analyze_executor is None:
+            # Spawn rather than fork: this process already runs download threads
+            analyze_executor = ProcessPoolExecutor(
+                max_workers=os.cpu_count(),
+                mp_context=multiprocessing.get_context('spawn')
+            )
+        return analyze_executor
+
+def reset_analyze_executor(executor):
+    """Drop a broken process pool so the next batch gets a fresh one"""
+    global analyze_executor
+    with analyze_executor_lock:
+        # Another batch may already have replaced it; leave a newer pool alone
+        if analyze_executor is executor:
+            executor.shutdown(wait=False, cancel_futures=True)
+            analyze_executor = None
+
+@app.route('/analyze-batch', methods=['POST'])
+def analyze_batch():
+    payload = request.get_json(silent=True)
+    if payload is None:
+        urls = request.form.getlist('urls')
+    elif isinstance(payload, dict):
+        urls = payload.get('urls')
+    else:
+        # Also accept a bare JSON list of URLs
+        urls = payload
+    
+    if not isinstance(urls, list) or not urls:
+        return jsonify({'error': 'Please provide a list of YouTube URLs'}), 400
+    
+    if len(urls) > MAX_BATCH_URLS:
+        return jsonify({'error': f'At most {MAX_BATCH_URLS} URLs can be analyzed at once'}), 400
+    
+    results = []
+    pending = []
+    for url in urls:
+        if not isinstance(url, str) or not is_youtube_url(url.strip()):
+            results.append({'url': url, 'error': 'Invalid YouTube URL'})
+            continue
+        
+        result = {'url': url.strip()}
+        video_info = get_cached_video_info(get_video_id(result['url']))
+        if video_info:
+            result['video_info'] = video_info
+        else:
+            pending.append(result)
+        results.append(result)
+    
+    # Extract cache misses in parallel, then write the results through the cache
+    pending_urls = [result['url'] for result in pending]
+    executor = get_analyze_executor()
+    try:
+        extracted_results = list(executor.map(extract_video_info, pending_urls))
+    except BrokenProcessPool as e:
+        logging.error(f"Batch analysis worker died: {e}")
+        reset_analyze_executor(executor)
+        extracted_results = [None] * len(pending)
+    except CancelledError:
+        logging.error("Batch analysis was cancelled by a pool shutdown")
+        extracted_results = [None] * len(pending)
+    
+    for result, extracted in zip(pending, extracted_results):
+        if extracted:
+            video_data, video_info = extracted
+            cache_video_info(get_video_id(result['url']), video_data, video_info)
+            result['video_info'] = video_info
+        else:
+            result['error'] = 'Unable to analyze video'
+    
+    return jsonify(results)
+
 @app.route('/download', methods=['POST'])
 def start_download():
     url = request.form.get('url')
@@ -285,27 +507,56 @@ def start_download():
         flash('Missing URL or quality selection', 'error')
         return redirect(url_for('index'))
     
+    if get_quality_options(quality) is None:
+        flash('Invalid quality selection', 'error')
+        return redirect(url_for('index'))
+    
     # Generate unique download ID
-    download_id = f"{get_video_id(url)}_{quality}_{int(time.time())}"
+    download_id = secrets.token_urlsafe(12)
+    
+    # Initialize progress before the thread starts so listeners never miss it
+    update_progress(
+        download_id,
+        percentage=0,
+        bytes_downloaded=0,
+        total_size=0,
+        status='starting',
+        title='Getting video info...'
+    )
     
-    # Start download in background thread
-    thread = threading.Thread(target=download_video_thread, args=(url, quality, download_id))
-    thread.daemon = True
-    thread.start()
+    # Queue download on the background worker pool
+    download_executor.submit(download_video_thread, url, quality, download_id)
     
     return render_template('download.html', download_id=download_id)
 
 @app.route('/progress/<download_id>')
 def get_progress(download_id):
-    progress = download_progress.get(download_id, {
-        'status': 'not_found',
-        'error': 'Download not found'
-    })
-    return jsonify(progress)
+    progress = read_progress(download_id) or PROGRESS_NOT_FOUND
+    return Response(json_dumps(progress), mimetype='application/json')
+
+@app.route('/progress-stream/<download_id>')
+def stream_progress(download_id):
+    """Push progress to the client as Server-Sent Events when it changes"""
+    def generate():
+        last = None
+        for progress in progress_updates(download_id):
+            progress = progress or PROGRESS_NOT_FOUND
+            if progress == last:
+                # Keep idle connections from being dropped by proxies
+                yield ': keep-alive\n\n'
+                continue
+            
+            yield f"data: {json_dumps(progress)}\n\n"
+            last = progress
+            if progress['status'] in ('completed', 'error', 'not_found'):
+                return
+    
+    return Response(generate(), mimetype='text/event-stream',
+                    headers={'Cache-Control': 'no-cache'})
 
 @app.route('/download-file/<download_id>')
 def download_file(download_id):
-    progress = download_progress.get(download_id)
+    progress = read_progress(download_id)
     if not progress or progress.get('status') != 'completed':
         flash('File not ready for download', 'error')
         return redirect(url_for('index'))
@@ -315,7 +566,17 @@ def download_file(download_id):
         flash('File not found', 'error')
         return redirect(url_for('index'))
     
-    return send_file(filepath, as_attachment=True)
+    # send_file hands the open file to the server's wsgi.file_wrapper, which
+    # gunicorn serves with sendfile(2); with USE_X_SENDFILE a fronting web
+    # server streams it instead and Python never touches the bytes
+    return send_file(os.path.abspath(filepath), as_attachment=True, conditional=True)
+
+@app.route('/cache/clear', methods=['POST'])
+def clear_cache():
+    with meta_cache_lock:
+        META_CACHE.clear()
+        RAW_META_CACHE.clear()
+    return jsonify({'status': 'cleared'})
 
 @app.errorhandler(404)
 def not_found_error(error):
@@ -327,4 +588,5 @@ def internal_error(error):
     return render_template('index.html'), 500
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
\ No newline at end of file
+    # Development server only; production runs under gunicorn (see Procfile)
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get("FLASK_DEBUG") == "1", threaded=True)
\ No newline at end of file
@@ -53,7 +53,7 @@ document.addEventListener('DOMContentLoaded', function() {
  * Validate YouTube URL
  */
 function isValidYouTubeUrl(url) {
-    const youtubeRegex = /^(https?:\/\/)?(www\.)?(youtube|youtu|youtube-nocookie)\.(com|be)\/(watch\?v=|embed\/|v\/|.+\?v=)?([^&=%\?]{11})/;
+    const youtubeRegex = /^(https?:\/\/)?(www\.|m\.|music\.)?(youtube|youtu|youtube-nocookie)\.(com|be)\/(watch\?v=|embed\/|v\/|.+\?v=)?([^&=%\?]{11})/;
     return youtubeRegex.test(url);
 }
 